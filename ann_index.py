@@ -0,0 +1,466 @@
+"""In-process approximate nearest neighbour index for large help corpora.
+
+An inverted-file (IVF) index over NumPy: a k-means coarse quantizer splits
+the vectors into ``n_lists`` inverted lists and a query only scans the
+``n_probe`` closest lists, so query time grows with the probed lists rather
+than the corpus. With ``pq_m > 0`` the residual of every vector is product
+quantized into ``pq_m`` one-byte codes and scored with asymmetric distance
+tables (IVF-PQ), trading some recall for ~16x less memory.
+
+``n_probe`` is the recall/latency knob: raise it for recall, lower it for speed.
+
+``SharedIVFIndex`` shares one index file between worker processes. Inserts are
+appended to a per-build log next to the file instead of rewriting it, and every
+process replays new log records (or reloads a rebuilt file) when it next checks.
+
+Usage:
+    python ann_index.py build --n-lists 1024 --pq-m 16
+    python ann_index.py benchmark --queries query_log.jsonl --n-probe 1 4 16 64
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+PQ_CENTROIDS = 256
+ENCODE_CHUNK = 16384
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class IVFIndex:
+    """IVF (optionally IVF-PQ) index with incremental inserts and persistence"""
+
+    def __init__(self, n_lists: int = 256, n_probe: int = 8, pq_m: int = 0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.pq_m = pq_m
+        self.version = 0
+        self.centroids: Optional[np.ndarray] = None
+        self.codebooks: Optional[np.ndarray] = None  # (pq_m, 256, dim / pq_m)
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self._rows: Dict[int, List[np.ndarray]] = {}  # list -> chunks of row numbers
+        self._data: Dict[int, List[np.ndarray]] = {}  # list -> chunks of vectors or PQ codes
+        self._lock = threading.Lock()
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # Training
+    def train(self, vectors):
+        """Fit the coarse quantizer (and PQ codebooks) on a sample of vectors"""
+        vectors = _normalize(vectors)
+        n, dim = vectors.shape
+        if self.pq_m and dim % self.pq_m:
+            raise ValueError(f"dimension {dim} is not divisible by pq_m={self.pq_m}")
+        n_lists = min(self.n_lists, n)
+        coarse = MiniBatchKMeans(n_clusters=n_lists, random_state=0, n_init=3, batch_size=4096)
+        coarse.fit(vectors)
+        centroids = coarse.cluster_centers_.astype(np.float32)
+
+        codebooks = None
+        if self.pq_m:
+            residuals = vectors - centroids[coarse.labels_]
+            sub_dim = dim // self.pq_m
+            n_codes = min(PQ_CENTROIDS, n)
+            codebooks = np.stack([
+                KMeans(n_clusters=n_codes, random_state=0, n_init=1, max_iter=25)
+                .fit(residuals[:, m * sub_dim:(m + 1) * sub_dim]).cluster_centers_
+                for m in range(self.pq_m)
+            ]).astype(np.float32)
+
+        with self._lock:
+            self.n_lists = n_lists
+            self.centroids = centroids
+            self.codebooks = codebooks
+            self.ids, self.documents = [], []
+            self._rows, self._data = {}, {}
+
+    # Inserts
+    def _coarse_scores(self, vectors: np.ndarray) -> np.ndarray:
+        """Negated half squared L2 distance to each centroid, up to a constant"""
+        return vectors @ self.centroids.T - 0.5 * (self.centroids ** 2).sum(axis=1)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(self._coarse_scores(vectors), axis=1)
+
+    def _encode(self, residuals: np.ndarray) -> np.ndarray:
+        sub_dim = residuals.shape[1] // self.pq_m
+        codes = np.empty((len(residuals), self.pq_m), dtype=np.uint8)
+        for m in range(self.pq_m):
+            codebook = self.codebooks[m]
+            codebook_sq = (codebook ** 2).sum(axis=1)
+            # argmin ||x - c||^2 == argmin ||c||^2 - 2 x.c; chunked to bound the temporary
+            for start in range(0, len(residuals), ENCODE_CHUNK):
+                sub = residuals[start:start + ENCODE_CHUNK, m * sub_dim:(m + 1) * sub_dim]
+                codes[start:start + ENCODE_CHUNK, m] = np.argmin(codebook_sq - 2 * sub @ codebook.T, axis=1)
+        return codes
+
+    def add(self, ids: Sequence[str], vectors, documents: Sequence[str]):
+        """Insert vectors into their nearest inverted lists"""
+        if not self.trained:
+            raise RuntimeError("index must be trained before adding vectors")
+        vectors = _normalize(vectors).reshape(len(ids), -1)
+        lists = self._assign(vectors)
+        payload = self._encode(vectors - self.centroids[lists]) if self.pq_m else vectors
+
+        with self._lock:
+            start = len(self.ids)
+            self.ids.extend(ids)
+            self.documents.extend(documents)
+            rows = np.arange(start, start + len(ids))
+            for list_no in np.unique(lists):
+                mask = lists == list_no
+                self._rows.setdefault(int(list_no), []).append(rows[mask])
+                self._data.setdefault(int(list_no), []).append(payload[mask])
+
+    def _list(self, list_no: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Inverted list contents, consolidating chunks left by inserts"""
+        rows, data = self._rows.get(list_no), self._data.get(list_no)
+        if not rows:
+            return None, None
+        if len(rows) > 1:
+            rows[:] = [np.concatenate(rows)]
+            data[:] = [np.concatenate(data)]
+        return rows[0], data[0]
+
+    # Search
+    def search(self, embedding, n_results: int = 3,
+               n_probe: Optional[int] = None) -> List[Tuple[str, str, float]]:
+        """Approximate top-k (id, document, cosine score) for a query embedding"""
+        if not self.trained or not self.ids:
+            return []
+        query = _normalize(embedding)
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        coarse_scores = self._coarse_scores(query)
+        probes = np.argpartition(-coarse_scores, n_probe - 1)[:n_probe]
+
+        candidate_rows, candidate_scores = [], []
+        for list_no in probes:
+            # Only consolidation needs the lock, the scan works on the consolidated arrays
+            with self._lock:
+                rows, data = self._list(int(list_no))
+            if rows is None:
+                continue
+            if self.pq_m:
+                # Asymmetric distance: ||q - c - r||^2 from per-subspace lookup tables
+                residual = query - self.centroids[list_no]
+                sub_dim = residual.shape[0] // self.pq_m
+                tables = ((residual.reshape(self.pq_m, 1, sub_dim) - self.codebooks) ** 2).sum(axis=2)
+                distances = tables[np.arange(self.pq_m), data].sum(axis=1)
+                scores = 1.0 - distances / 2.0
+            else:
+                scores = data @ query
+            candidate_rows.append(rows)
+            candidate_scores.append(scores)
+
+        if not candidate_rows:
+            return []
+        rows = np.concatenate(candidate_rows)
+        scores = np.concatenate(candidate_scores)
+        k = min(n_results, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[rows[i]], self.documents[rows[i]], float(scores[i])) for i in top]
+
+    # Persistence
+    def save(self, path: str):
+        """Atomically persist the index to an .npz file"""
+        with self._lock:
+            lists = [self._list(list_no) for list_no in range(self.n_lists)]
+            payload_shape = (0, self.pq_m) if self.pq_m else (0, self.centroids.shape[1])
+            payload_dtype = np.uint8 if self.pq_m else np.float32
+            rows = [r if r is not None else np.empty(0, dtype=np.int64) for r, _ in lists]
+            data = [d if d is not None else np.empty(payload_shape, dtype=payload_dtype) for _, d in lists]
+            metadata = json.dumps({
+                "version": self.version,
+                "n_probe": self.n_probe,
+                "pq_m": self.pq_m,
+                "ids": self.ids,
+                "documents": self.documents
+            }).encode("utf-8")
+            arrays = {
+                "centroids": self.centroids,
+                "list_sizes": np.array([len(r) for r in rows], dtype=np.int64),
+                "rows": np.concatenate(rows),
+                "data": np.concatenate(data),
+                "metadata": np.frombuffer(metadata, dtype=np.uint8)
+            }
+            if self.pq_m:
+                arrays["codebooks"] = self.codebooks
+
+        # Unique per writer: two rebuild jobs in one process must not share a temp file
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".tmp.",
+                                        dir=os.path.dirname(os.path.abspath(path)))
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path) as arrays:
+            metadata = json.loads(arrays["metadata"].tobytes())
+            centroids = arrays["centroids"]
+            index = cls(n_lists=len(centroids), n_probe=metadata["n_probe"], pq_m=metadata["pq_m"])
+            index.version = metadata.get("version", 0)
+            index.centroids = centroids
+            index.codebooks = arrays["codebooks"] if index.pq_m else None
+            index.ids, index.documents = metadata["ids"], metadata["documents"]
+            bounds = np.concatenate([[0], np.cumsum(arrays["list_sizes"])])
+            rows, data = arrays["rows"], arrays["data"]
+            for list_no in range(index.n_lists):
+                start, end = bounds[list_no], bounds[list_no + 1]
+                if end > start:
+                    index._rows[list_no] = [rows[start:end]]
+                    index._data[list_no] = [data[start:end]]
+        return index
+
+
+class SharedIVFIndex:
+    """An index file shared by worker processes, with an append-only insert log.
+
+    ``insert`` appends records to ``<path>.<build version>.log`` (O(inserted
+    rows), no rewrite of the index file). Each process re-checks the file and
+    its log at most every ``reload_interval`` seconds, reloading a rebuilt
+    file and replaying log records past the offset it has already applied.
+    Searches never wait for that: the check runs on a background thread and
+    the current index keeps serving until the new one is ready.
+    """
+
+    def __init__(self, path: str, n_probe: int = 8, reload_interval: float = 5.0):
+        self.path = path
+        self.n_probe = n_probe
+        self.reload_interval = reload_interval
+        self.index: Optional[IVFIndex] = None
+        self._signature = None
+        self._log_offset = 0
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+
+    def _log_path(self, version: int) -> str:
+        return f"{self.path}.{version}.log"
+
+    def _log_version(self, log_path: str) -> Optional[int]:
+        try:
+            return int(log_path[len(self.path) + 1:-len(".log")])
+        except ValueError:
+            return None
+
+    def maybe_reload(self, force: bool = False) -> bool:
+        """Reload a rebuilt index file and apply new insert log records"""
+        with self._lock:
+            self._next_check = time.monotonic() + self.reload_interval
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                return False
+            signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+            reloaded = False
+            if force or signature != self._signature:
+                try:
+                    index = IVFIndex.load(self.path)
+                except Exception as e:
+                    logging.error(f"ANN index load error: {str(e)}")
+                    return False
+                index.n_probe = self.n_probe
+                # Bring the new build up to date before it starts serving
+                offset = self._replay_log(index, 0)
+                self.index, self._signature, self._log_offset = index, signature, offset
+                reloaded = True
+                logging.info(f"Loaded ANN index version {index.version} ({len(index)} vectors)")
+            else:
+                self._log_offset = self._replay_log(self.index, self._log_offset)
+            return reloaded
+
+    def _replay_log(self, index: IVFIndex, offset: int) -> int:
+        """Add log records past ``offset`` to ``index``, returns the new offset"""
+        try:
+            with open(self._log_path(index.version), "rb") as f:
+                f.seek(offset)
+                pending = f.read()
+        except FileNotFoundError:
+            return offset
+        # A record is complete once its newline is written
+        complete = pending[:pending.rfind(b"\n") + 1]
+        if not complete:
+            return offset
+        records = [json.loads(line) for line in complete.splitlines() if line.strip()]
+        index.add([r["id"] for r in records], [r["vector"] for r in records],
+                  [r["document"] for r in records])
+        return offset + len(complete)
+
+    def current(self) -> Optional[IVFIndex]:
+        """Index to serve, starting a background reload check when one is due"""
+        if time.monotonic() >= self._next_check and self._check_lock.acquire(blocking=False):
+            self._next_check = time.monotonic() + self.reload_interval
+
+            def check():
+                try:
+                    self.maybe_reload()
+                finally:
+                    self._check_lock.release()
+
+            threading.Thread(target=check, name="ann-index-reload", daemon=True).start()
+        return self.index
+
+    def search(self, embedding, n_results: int = 3) -> List[Tuple[str, str, float]]:
+        index = self.current()
+        return index.search(embedding, n_results) if index else []
+
+    def insert(self, ids: Sequence[str], vectors, documents: Sequence[str]) -> bool:
+        """Append vectors to the current build's log, returns False without an index"""
+        self.maybe_reload()
+        if self.index is None:
+            return False
+        payload = "".join(
+            json.dumps({"id": doc_id, "document": document, "vector": [float(x) for x in vector]}) + "\n"
+            for doc_id, vector, document in zip(ids, vectors, documents)
+        ).encode("utf-8")
+        self._append_log(self.index.version, payload)
+        self.maybe_reload()
+        return True
+
+    def _append_log(self, version: int, payload: bytes):
+        # One O_APPEND write per batch so concurrent writers never interleave records
+        fd = os.open(self._log_path(version), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, payload)
+        finally:
+            os.close(fd)
+
+    def log_mark(self) -> Optional[Tuple[int, int]]:
+        """Current build version and its insert log size, or None without an index
+
+        Take the mark before reading the vectors a rebuild is trained on and
+        pass it to ``replace``.
+        """
+        self.maybe_reload()
+        if self.index is None:
+            return None
+        version = self.index.version
+        try:
+            return version, os.path.getsize(self._log_path(version))
+        except FileNotFoundError:
+            return version, 0
+
+    def replace(self, index: IVFIndex, mark: Optional[Tuple[int, int]] = None):
+        """Persist a rebuilt index as a new build and drop superseded insert logs
+
+        ``mark`` is ``log_mark()`` from before the rebuild read its vectors:
+        records appended to that build's log since then are carried over to
+        the new build, and only logs of builds older than it are deleted.
+        """
+        index.version = time.time_ns()
+        index.n_probe = self.n_probe
+        index.save(self.path)
+        if mark is not None:
+            read_version, read_offset = mark
+            try:
+                with open(self._log_path(read_version), "rb") as f:
+                    f.seek(read_offset)
+                    pending = f.read()
+            except FileNotFoundError:
+                pending = b""
+            pending = pending[:pending.rfind(b"\n") + 1]
+            if pending:
+                self._append_log(index.version, pending)
+            for log_path in glob.glob(glob.escape(self.path) + ".*.log"):
+                version = self._log_version(log_path)
+                if version is not None and version < read_version:
+                    os.remove(log_path)
+        self.maybe_reload(force=True)
+
+
+# Benchmark against the Chroma query used by /chat
+def benchmark(index: IVFIndex, collection, query_embeddings, n_results: int,
+              n_probes: Sequence[int]) -> List[Dict]:
+    """Recall@k and mean latency of the ANN index relative to Chroma"""
+    exact, exact_time = [], 0.0
+    for embedding in query_embeddings:
+        started = time.perf_counter()
+        result = collection.query(query_embeddings=[embedding], n_results=n_results, include=[])
+        exact_time += time.perf_counter() - started
+        exact.append(set(result["ids"][0]))
+
+    report = [{"method": "chroma", "n_probe": None, "recall": 1.0,
+               "latency_ms": 1000 * exact_time / len(exact)}]
+    for n_probe in n_probes:
+        hits, elapsed = 0, 0.0
+        for embedding, truth in zip(query_embeddings, exact):
+            started = time.perf_counter()
+            found = index.search(embedding, n_results, n_probe=n_probe)
+            elapsed += time.perf_counter() - started
+            hits += len(truth & {doc_id for doc_id, _, _ in found})
+        total = sum(len(truth) for truth in exact) or 1
+        report.append({"method": "ivf-pq" if index.pq_m else "ivf", "n_probe": n_probe,
+                       "recall": hits / total, "latency_ms": 1000 * elapsed / len(exact)})
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or benchmark the ANN retrieval index")
+    parser.add_argument("command", choices=["build", "benchmark"])
+    parser.add_argument("--index", default=os.getenv("ANN_INDEX_PATH", "./capcut_ann.npz"))
+    parser.add_argument("--n-lists", type=int, default=int(os.getenv("ANN_N_LISTS", "256")))
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[8])
+    parser.add_argument("--pq-m", type=int, default=int(os.getenv("ANN_PQ_M", "0")),
+                        help="PQ sub-quantizers, 0 stores full vectors")
+    parser.add_argument("--queries", help="query log (plain text or JSONL) for the benchmark")
+    parser.add_argument("--limit", type=int, default=200, help="benchmark queries to run")
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    from core import embedding_function, get_chroma_collection
+    from faq_index import read_log_questions
+    from vector_snapshot import read_collection
+
+    collection = get_chroma_collection()
+    shared = SharedIVFIndex(args.index, n_probe=args.n_probe[0])
+    if args.command == "build":
+        mark = shared.log_mark()
+        ids, vectors, documents = read_collection(collection)
+        if not ids:
+            parser.error("collection is empty, nothing to index")
+        index = IVFIndex(n_lists=args.n_lists, n_probe=args.n_probe[0], pq_m=args.pq_m)
+        index.train(vectors)
+        index.add(ids, vectors, documents)
+        shared.replace(index, mark)
+        print(f"Indexed {len(index)} vectors into {index.n_lists} lists at {args.index}")
+        return
+
+    if not args.queries:
+        parser.error("benchmark needs --queries")
+    if not shared.maybe_reload():
+        parser.error(f"no index at {args.index}")
+    index = shared.index
+    questions = list(dict.fromkeys(read_log_questions(args.queries)))[:args.limit]
+    embeddings = [e for e in embedding_function(questions) if len(e)]
+    if not embeddings:
+        parser.error("no query embeddings could be computed")
+    for row in benchmark(index, collection, embeddings, args.k, args.n_probe):
+        n_probe = "-" if row["n_probe"] is None else row["n_probe"]
+        print(f"{row['method']:>7}  n_probe={n_probe:<5} recall@{args.k}={row['recall']:.3f}  "
+              f"{row['latency_ms']:.2f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Batch intent labeling with the same logic as the live /chat path.
+
+Rows are streamed from JSONL or CSV, normalized with ``preprocess_text``,
+parsed with ``nlp.pipe`` (optionally across processes) and labeled with
+``intent_from_doc``, so results match ``detect_editing_intent`` row for row.
+Labeled rows are streamed back out in the input format.
+
+Usage:
+    python batch_nlu.py questions.csv labeled.csv --text-field question
+    python batch_nlu.py dump.jsonl labeled.jsonl --n-process 4 --batch-size 1000
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import sys
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, TextIO
+
+DEFAULT_BATCH_SIZE = 256
+
+
+def detect_format(filename: str) -> str:
+    return "csv" if filename.lower().endswith(".csv") else "jsonl"
+
+
+def read_rows(stream: TextIO, fmt: str, skipped: List[int] = None) -> Iterator[Dict]:
+    """Stream rows from a JSONL or CSV text stream
+
+    JSONL lines that are not JSON objects are logged and skipped rather than
+    ending the stream; their line numbers are appended to ``skipped``.
+    """
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+        return
+    for line_no, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        if not isinstance(row, dict):
+            logging.warning(f"Skipping line {line_no}: not a JSON object")
+            if skipped is not None:
+                skipped.append(line_no)
+            continue
+        yield row
+
+
+def label_rows(rows: Iterable[Dict], nlp, preprocess: Callable, intent_fn: Callable,
+               text_field: str = "question", batch_size: int = DEFAULT_BATCH_SIZE,
+               n_process: int = 1) -> Iterator[Dict]:
+    """Yield rows with ``intent`` and ``entities`` added, in input order"""
+    texts = ((preprocess(str(row.get(text_field) or "")), row) for row in rows)
+    for doc, row in nlp.pipe(texts, as_tuples=True, batch_size=batch_size, n_process=n_process):
+        intent, entities = intent_fn(doc, doc.text)
+        row["intent"] = intent
+        row["entities"] = entities
+        yield row
+
+
+def format_rows(rows: Iterable[Dict], fmt: str) -> Iterator[str]:
+    """Serialize labeled rows to JSONL lines or CSV text chunks"""
+    if fmt != "csv":
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+        return
+
+    writer = None
+    buffer = io.StringIO()
+    for row in rows:
+        row = dict(row, entities=json.dumps(row["entities"]))
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(row.keys()), extrasaction="ignore")
+            writer.writeheader()
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+class RateMeter:
+    """Counts rows passing through an iterator and reports rows/sec"""
+
+    def __init__(self, rows: Iterable, report_every: int = 0, out: TextIO = None):
+        self.rows = rows
+        self.count = 0
+        self.report_every = report_every
+        self.out = out
+        self.started = None
+
+    def __iter__(self):
+        self.started = time.perf_counter()
+        for row in self.rows:
+            self.count += 1
+            if self.report_every and self.count % self.report_every == 0:
+                print(self.summary(), file=self.out)
+            yield row
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.started if self.started else 0
+        return self.count / elapsed if elapsed else 0.0
+
+    def summary(self) -> str:
+        return f"{self.count} rows, {self.rate:.0f} rows/sec"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Label a question dump with editing intents")
+    parser.add_argument("input", help="JSONL or CSV file, '-' for JSONL on stdin")
+    parser.add_argument("output", help="JSONL or CSV file, '-' for JSONL on stdout")
+    parser.add_argument("--text-field", default="question")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--n-process", type=int, default=1)
+    parser.add_argument("--report-every", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    from core import get_nlp, intent_from_doc, preprocess_text
+
+    in_format = "jsonl" if args.input == "-" else detect_format(args.input)
+    out_format = "jsonl" if args.output == "-" else detect_format(args.output)
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8", errors="replace", newline="")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+
+    skipped = []
+    try:
+        meter = RateMeter(
+            label_rows(read_rows(source, in_format, skipped), get_nlp(), preprocess_text, intent_from_doc,
+                       args.text_field, args.batch_size, args.n_process),
+            report_every=args.report_every,
+            out=sys.stderr
+        )
+        for chunk in format_rows(meter, out_format):
+            sink.write(chunk)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    print(f"Done: {meter.summary()}, {len(skipped)} malformed lines skipped", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""NLU and knowledge-base helpers shared by the server and the offline tools.
+
+Importing this module only configures the Gemini client: it never touches the
+application database, runs migrations or starts background threads, so CLIs
+such as faq_index.py and batch_nlu.py can use it against a live deployment.
+The spaCy model is loaded on first use.
+"""
+import logging
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, Tuple
+
+import chromadb
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+import google.generativeai as genai
+import spacy
+
+# Configure Gemini
+genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+
+
+@lru_cache(maxsize=None)
+def get_nlp():
+    """Load the spaCy pipeline once per process"""
+    return spacy.load("en_core_web_sm")
+
+
+# RAG Configuration
+class CapcutEmbeddingFunction(EmbeddingFunction):
+    def __init__(self):
+        self.model = 'models/embedding-001'
+
+    def __call__(self, input: Documents) -> Embeddings:
+        """Generate embeddings using Gemini API"""
+        try:
+            return genai.embed_content(
+                model=self.model,
+                content=input,
+                task_type="retrieval_document"
+            )["embedding"]
+        except Exception as e:
+            logging.error(f"Embedding error: {str(e)}")
+            return [[]] * len(input)  # Return empty embeddings on failure
+
+embedding_function = CapcutEmbeddingFunction()
+
+# One Chroma client per process: concurrent PersistentClient construction
+# (e.g. from parallel background jobs) fails inside chromadb
+_chroma_client = None
+_chroma_lock = threading.Lock()
+
+def get_chroma_client():
+    global _chroma_client
+    with _chroma_lock:
+        if _chroma_client is None:
+            _chroma_client = chromadb.PersistentClient(path='./capcut_rag_store')
+        return _chroma_client
+
+def get_chroma_collection():
+    """Get or create Chroma collection with error handling"""
+    try:
+        client = get_chroma_client()
+        return client.get_or_create_collection(
+            name="capcut_knowledge_v1",
+            embedding_function=CapcutEmbeddingFunction()
+        )
+    except Exception as e:
+        logging.error(f"ChromaDB error: {str(e)}")
+        raise
+
+# Core Functions
+def preprocess_text(text: str) -> str:
+    """Clean user input for processing"""
+    return re.sub(r'[^\w\s\?]', '', text.lower()).strip()
+
+# Detection vocabulary
+EDITING_VERBS = {'edit', 'trim', 'cut', 'merge', 'adjust', 'add'}
+EDITING_TOOLS = {'transition', 'filter', 'text', 'effect', 'audio'}
+
+def intent_from_doc(doc, text: str) -> Tuple[str, Dict]:
+    """Extract intent and entities from a parsed spaCy doc"""
+    intent = "general"
+    entities = {}
+
+    for token in doc:
+        if token.lemma_ in EDITING_VERBS:
+            intent = "editing_operation"
+        if token.lemma_ in EDITING_TOOLS:
+            entities.setdefault('tools', []).append(token.text)
+
+    if 'premium' in text or 'pro' in text:
+        entities['premium'] = True
+
+    return intent, entities
+
+def detect_editing_intent(text: str) -> Tuple[str, Dict]:
+    """Analyze user input for video editing context"""
+    try:
+        return intent_from_doc(get_nlp()(text), text)
+    except Exception as e:
+        logging.error(f"NLU error: {str(e)}")
+        return "general", {}
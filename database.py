@@ -0,0 +1,81 @@
+"""Connection-level tuning for the application database.
+
+SQLite connections get WAL journaling and relaxed fsync pragmas at connect
+time so readers no longer block behind writers; any other backend (e.g. a
+Postgres ``DATABASE_URL``) is used with a pre-pinged connection pool. Every
+statement is timed and the slow ones are logged.
+"""
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+slow_query_logger = logging.getLogger("capcut.slow_queries")
+
+DEFAULT_DATABASE_URL = "sqlite:///capcut.db"
+
+
+def database_url(instance_path: str = None) -> str:
+    """Configured database URL
+
+    Flask-SQLAlchemy resolves relative SQLite paths against the app's instance
+    folder; pass ``instance_path`` to get the same file outside the app.
+    """
+    url = os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL)
+    parsed = make_url(url)
+    if (instance_path and parsed.drivername.startswith("sqlite") and parsed.database
+            and parsed.database != ":memory:" and not os.path.isabs(parsed.database)):
+        return parsed.set(database=os.path.join(instance_path, parsed.database)).render_as_string(hide_password=False)
+    return url
+
+
+def engine_options(uri: str, pool_size: int = 5, max_overflow: int = 10,
+                   pool_timeout: int = 30, pool_recycle: int = 1800) -> Dict:
+    """SQLAlchemy engine options for the configured database URI"""
+    if uri.startswith("sqlite"):
+        if ":memory:" in uri or uri.rstrip("/") == "sqlite:":
+            return {}
+        return {
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_timeout": pool_timeout,
+            # Lock waits are governed by the busy_timeout pragma alone
+            "connect_args": {"check_same_thread": False}
+        }
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": pool_timeout,
+        "pool_recycle": pool_recycle,
+        "pool_pre_ping": True
+    }
+
+
+def install_sqlite_pragmas(busy_timeout_ms: int = 5000):
+    """Apply WAL, synchronous and busy timeout pragmas to every new SQLite connection"""
+    @event.listens_for(Engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        cursor.close()
+
+
+def install_slow_query_log(threshold_ms: float = 100.0):
+    """Log statements that take longer than ``threshold_ms``"""
+    @event.listens_for(Engine, "before_cursor_execute")
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def log_slow_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["query_started"].pop()) * 1000
+        if elapsed_ms >= threshold_ms:
+            slow_query_logger.warning(f"Slow query ({elapsed_ms:.1f} ms): {' '.join(statement.split())}")
@@ -0,0 +1,225 @@
+"""Server-side engagement tracking for adaptive survey prompts.
+
+Each chat session keeps a few integer counters: a lifetime message count and
+a small ring of per-bucket counts covering the recent activity window. Every
+update and eligibility check touches a fixed number of fields, so deciding
+whether to suggest the survey is O(1) per request.
+
+Counters live in a store. ``MemoryEngagementStore`` keeps them in the process
+(single-process deployments and tests) and evicts idle sessions in
+least-recently-seen order; ``SQLEngagementStore`` keeps one row per session
+in a table shared by every worker process, so a session's messages are
+counted in one place whichever worker serves them.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+
+class _SessionCounters:
+    __slots__ = ("total", "buckets", "current_bucket", "recent", "last_seen",
+                 "last_suggested_at", "suggestions", "surveyed")
+
+    def __init__(self, n_buckets: int):
+        self.total = 0
+        self.buckets = [0] * n_buckets
+        self.current_bucket = None
+        self.recent = 0
+        self.last_seen = 0.0
+        self.last_suggested_at = None
+        self.suggestions = 0
+        self.surveyed = False
+
+
+class MemoryEngagementStore:
+    """Per-process session counters with LRU/TTL eviction"""
+
+    def __init__(self, session_ttl: float = 3600, max_sessions: int = 100000):
+        self.session_ttl = session_ttl
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, _SessionCounters]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _session(self, session_id: str, now: float, n_buckets: int) -> _SessionCounters:
+        counters = self._sessions.get(session_id)
+        if counters is None:
+            counters = self._sessions[session_id] = _SessionCounters(n_buckets)
+        else:
+            self._sessions.move_to_end(session_id)
+        counters.last_seen = now
+
+        # Evict from the least recently seen end
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest is counters:
+                break
+            if len(self._sessions) <= self.max_sessions and now - oldest.last_seen < self.session_ttl:
+                break
+            self._sessions.popitem(last=False)
+        return counters
+
+    def update(self, session_id: str, now: float, n_buckets: int,
+               fn: Callable[[_SessionCounters], object]):
+        """Apply ``fn`` to a session's counters atomically, returns its result"""
+        with self._lock:
+            return fn(self._session(session_id, now, n_buckets))
+
+
+class SQLEngagementStore:
+    """Session counters in a shared table, one row per session.
+
+    Each update is one short transaction that writes the session's row before
+    reading it, so concurrent workers serialize on that row (a row lock on
+    Postgres, the write lock on SQLite) and never act on stale counters.
+    SQLite and Postgres create missing rows with ON CONFLICT DO NOTHING; other
+    dialects insert inside a savepoint and fall back to an update. Rows idle
+    for ``session_ttl`` are deleted every ``cleanup_every`` updates.
+    """
+
+    def __init__(self, engine_fn: Callable, table, session_ttl: float = 3600, cleanup_every: int = 1000):
+        self.engine_fn = engine_fn
+        self.table = table
+        self.session_ttl = session_ttl
+        self.cleanup_every = cleanup_every
+        self._updates = 0
+
+    def _touch(self, conn, session_id: str, now: float):
+        """Create the session's row if it is missing and write last_seen to it"""
+        table = self.table
+        values = dict(session_id=session_id, total=0, suggestions=0, surveyed=False, last_seen=now)
+        touch = update(table).where(table.c.session_id == session_id).values(last_seen=now)
+        if conn.dialect.name in ("postgresql", "sqlite"):
+            if conn.dialect.name == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            conn.execute(insert(table).values(**values).on_conflict_do_nothing(index_elements=["session_id"]))
+            conn.execute(touch)
+        elif conn.execute(touch).rowcount == 0:
+            # Other dialects: a worker that loses the insert race updates the
+            # row the winner created
+            try:
+                with conn.begin_nested():
+                    conn.execute(table.insert().values(**values))
+            except IntegrityError:
+                conn.execute(touch)
+
+    def _load(self, row, n_buckets: int) -> _SessionCounters:
+        counters = _SessionCounters(n_buckets)
+        counters.total = row.total
+        counters.current_bucket = row.current_bucket
+        if row.buckets:
+            buckets = [int(count) for count in row.buckets.split(",")]
+            if len(buckets) == n_buckets:
+                counters.buckets = buckets
+                counters.recent = sum(buckets)
+            else:
+                counters.current_bucket = None  # bucket layout changed, restart the window
+        counters.last_seen = row.last_seen
+        counters.last_suggested_at = row.last_suggested_at
+        counters.suggestions = row.suggestions
+        counters.surveyed = row.surveyed
+        return counters
+
+    def update(self, session_id: str, now: float, n_buckets: int,
+               fn: Callable[[_SessionCounters], object]):
+        """Apply ``fn`` to a session's counters atomically, returns its result"""
+        engine = self.engine_fn()
+        table = self.table
+        with engine.begin() as conn:
+            self._touch(conn, session_id, now)
+            counters = self._load(conn.execute(
+                select(table).where(table.c.session_id == session_id)
+            ).one(), n_buckets)
+            counters.last_seen = now
+            result = fn(counters)
+            conn.execute(update(table).where(table.c.session_id == session_id).values(
+                total=counters.total,
+                buckets=",".join(str(count) for count in counters.buckets),
+                current_bucket=counters.current_bucket,
+                last_suggested_at=counters.last_suggested_at,
+                suggestions=counters.suggestions,
+                surveyed=counters.surveyed
+            ))
+
+        self._updates += 1
+        if self._updates % self.cleanup_every == 0:
+            with engine.begin() as conn:
+                conn.execute(delete(table).where(table.c.last_seen < now - self.session_ttl))
+        return result
+
+
+class EngagementTracker:
+    """Per-session interaction counters and survey eligibility rules.
+
+    The survey is suggested on every ``every_n_messages``-th message once a
+    session has sent ``min_messages``, provided it sent at least
+    ``min_recent_messages`` within the last ``n_buckets * bucket_seconds``,
+    the previous suggestion is ``cooldown_seconds`` old, fewer than
+    ``max_suggestions`` were made, and the session has not taken the survey.
+    """
+
+    def __init__(self, every_n_messages: int = 5, min_messages: int = 5,
+                 min_recent_messages: int = 2, cooldown_seconds: float = 600,
+                 max_suggestions: int = 2, bucket_seconds: int = 60, n_buckets: int = 10,
+                 store=None):
+        self.every_n_messages = every_n_messages
+        self.min_messages = min_messages
+        self.min_recent_messages = min_recent_messages
+        self.cooldown_seconds = cooldown_seconds
+        self.max_suggestions = max_suggestions
+        self.bucket_seconds = bucket_seconds
+        self.n_buckets = n_buckets
+        self.store = store if store is not None else MemoryEngagementStore()
+
+    def _advance(self, counters: _SessionCounters, now: float):
+        """Rotate the bucket ring to the current time bucket"""
+        bucket = int(now // self.bucket_seconds)
+        if counters.current_bucket is None or bucket - counters.current_bucket >= self.n_buckets:
+            counters.buckets = [0] * self.n_buckets
+            counters.recent = 0
+        else:
+            for b in range(counters.current_bucket + 1, bucket + 1):
+                slot = b % self.n_buckets
+                counters.recent -= counters.buckets[slot]
+                counters.buckets[slot] = 0
+        counters.current_bucket = bucket
+
+    def record_interaction(self, session_id: str, now: Optional[float] = None) -> bool:
+        """Count one chat message and return whether to suggest the survey"""
+        now = time.time() if now is None else now
+
+        def record(counters: _SessionCounters) -> bool:
+            self._advance(counters, now)
+            counters.total += 1
+            counters.buckets[counters.current_bucket % self.n_buckets] += 1
+            counters.recent += 1
+
+            eligible = (
+                not counters.surveyed
+                and counters.suggestions < self.max_suggestions
+                and counters.total >= self.min_messages
+                and counters.total % self.every_n_messages == 0
+                and counters.recent >= self.min_recent_messages
+                and (counters.last_suggested_at is None
+                     or now - counters.last_suggested_at >= self.cooldown_seconds)
+            )
+            if eligible:
+                counters.suggestions += 1
+                counters.last_suggested_at = now
+            return eligible
+
+        return self.store.update(session_id, now, self.n_buckets, record)
+
+    def mark_surveyed(self, session_id: str, now: Optional[float] = None):
+        """Stop suggesting the survey to a session that has started it"""
+        now = time.time() if now is None else now
+
+        def mark(counters: _SessionCounters):
+            counters.surveyed = True
+
+        self.store.update(session_id, now, self.n_buckets, mark)
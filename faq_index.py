@@ -0,0 +1,247 @@
+"""Pre-generated answer index for frequent CapCut questions.
+
+The index is built offline from a file of vetted answers (optionally filtered
+down to the most frequent questions found in query logs) and written as a
+compact binary file that the server memory-maps at startup.
+
+File layout (little endian):
+    header   magic (8s) | build version (u64) | entry count (u32) | pad
+    records  key hash (u64) | blob offset (u64) | blob length (u32) | pad,
+             sorted by key hash
+    blob     "<key>\\0<answer>" UTF-8 entries
+
+Usage:
+    python faq_index.py --answers vetted_answers.jsonl --output faq_index.bin
+    python faq_index.py --answers vetted_answers.jsonl --log query_log.jsonl --top 200
+"""
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MAGIC = b"CCFAQIX1"
+HEADER = struct.Struct("<8sQI4x")
+RECORD = struct.Struct("<QQI4x")
+
+
+# Key helpers (shared by the builder and the /chat lookup)
+def question_key(cleaned_text: str) -> str:
+    """Index key for a question already normalized with preprocess_text"""
+    return "q:" + " ".join(cleaned_text.replace("?", " ").split())
+
+
+def intent_key(intent: str, entities: Dict) -> Optional[str]:
+    """Index key for an intent/tool combination, None when no tool was detected"""
+    tools = sorted({tool.lower() for tool in entities.get('tools', [])})
+    if not tools:
+        return None
+    return f"i:{intent}|t:{','.join(tools)}|p:{int(bool(entities.get('premium')))}"
+
+
+def key_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+# Writer
+def write_index(path: str, entries: Dict[str, str], version: Optional[int] = None) -> int:
+    """Atomically write entries (key -> answer) to path, returns the build version"""
+    version = int(time.time()) if version is None else version
+    records = []
+    blob = bytearray()
+    for key, answer in sorted(entries.items(), key=lambda item: key_hash(item[0])):
+        payload = key.encode("utf-8") + b"\0" + answer.encode("utf-8")
+        records.append(RECORD.pack(key_hash(key), len(blob), len(payload)))
+        blob += payload
+
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, version, len(records)))
+        f.write(b"".join(records))
+        f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return version
+
+
+# Reader
+class FaqIndex:
+    """Memory-mapped answer index with versioned hot reload.
+
+    The backing file is re-checked at most every ``reload_interval`` seconds
+    and swapped in when the builder replaces it.
+    """
+
+    def __init__(self, path: str, reload_interval: float = 1.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._state = None  # (mmap, version, count, file signature)
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> Optional[int]:
+        state = self._state
+        return state[1] if state else None
+
+    @property
+    def count(self) -> int:
+        state = self._state
+        return state[2] if state else 0
+
+    def maybe_reload(self, force: bool = False) -> bool:
+        """Swap in a new index file if it changed on disk"""
+        with self._lock:
+            self._next_check = time.monotonic() + self.reload_interval
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                self._state = None
+                return False
+            signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+            if not force and self._state and self._state[3] == signature:
+                return False
+            try:
+                self._state = self._open(signature)
+            except Exception as e:
+                logging.error(f"FAQ index load error: {str(e)}")
+                return False
+            logging.info(f"Loaded FAQ index version {self._state[1]} ({self._state[2]} entries)")
+            return True
+
+    def _open(self, signature):
+        with open(self.path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"bad magic in {self.path}")
+        if HEADER.size + count * RECORD.size > len(mm):
+            raise ValueError(f"truncated index {self.path}")
+        return mm, version, count, signature
+
+    def lookup(self, key: Optional[str]) -> Optional[str]:
+        """Return the stored answer for key, or None"""
+        if key is None:
+            return None
+        if time.monotonic() >= self._next_check:
+            self.maybe_reload()
+        state = self._state
+        if not state:
+            return None
+        mm, _, count, _ = state
+        target = key_hash(key)
+        blob_start = HEADER.size + count * RECORD.size
+
+        # Lower bound binary search over the sorted hash column
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if RECORD.unpack_from(mm, HEADER.size + mid * RECORD.size)[0] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        encoded_key = key.encode("utf-8") + b"\0"
+        while lo < count:
+            h, offset, length = RECORD.unpack_from(mm, HEADER.size + lo * RECORD.size)
+            if h != target:
+                break
+            payload = mm[blob_start + offset:blob_start + offset + length]
+            if payload.startswith(encoded_key):
+                return payload[len(encoded_key):].decode("utf-8")
+            lo += 1
+        return None
+
+
+# Offline builder
+def read_log_questions(path: str) -> Iterable[str]:
+    """Yield raw questions from a plain-text or JSONL query log"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                line = record.get("query") or record.get("message") or ""
+            if line:
+                yield line
+
+
+def read_vetted_answers(path: str, preprocess) -> Dict[str, str]:
+    """Load vetted answers keyed by question or intent/tool combination"""
+    entries = {}
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            answer = (record.get("answer") or "").strip()
+            if not answer:
+                logging.warning(f"Skipping line {line_no}: missing answer")
+                continue
+            if record.get("question"):
+                key = question_key(preprocess(record["question"]))
+            else:
+                key = intent_key(record.get("intent", "general"), {
+                    "tools": record.get("tools", []),
+                    "premium": record.get("premium", False)
+                })
+            if not key:
+                logging.warning(f"Skipping line {line_no}: needs a question or at least one tool")
+                continue
+            entries[key] = answer
+    return entries
+
+
+def frequent_keys(questions: Iterable[str], preprocess, detect_intent, top: int) -> Tuple[List, List]:
+    """Most frequent normalized questions and intent/tool keys in a log"""
+    question_counts = Counter(question_key(preprocess(q)) for q in questions)
+    question_counts.pop(question_key(""), None)
+    intent_counts = Counter()
+    for key, count in question_counts.items():
+        ikey = intent_key(*detect_intent(key[2:]))
+        if ikey:
+            intent_counts[ikey] += count
+    return question_counts.most_common(top), intent_counts.most_common(top)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the pre-generated FAQ answer index")
+    parser.add_argument("--answers", required=True, help="JSONL of vetted answers")
+    parser.add_argument("--log", help="query log used to select the most frequent keys")
+    parser.add_argument("--top", type=int, default=200, help="keys kept per kind when --log is given")
+    parser.add_argument("--output", default=os.getenv("FAQ_INDEX_PATH", "./faq_index.bin"))
+    parser.add_argument("--version", type=int, help="build version (defaults to a timestamp)")
+    args = parser.parse_args(argv)
+
+    from core import detect_editing_intent, preprocess_text
+
+    entries = read_vetted_answers(args.answers, preprocess_text)
+    if args.log:
+        top_questions, top_intents = frequent_keys(
+            read_log_questions(args.log), preprocess_text, detect_editing_intent, args.top
+        )
+        wanted = [key for key, _ in top_questions + top_intents]
+        missing = [(key, count) for key, count in top_questions + top_intents if key not in entries]
+        entries = {key: entries[key] for key in wanted if key in entries}
+        for key, count in missing:
+            print(f"missing vetted answer ({count} hits): {key}", file=sys.stderr)
+
+    version = write_index(args.output, entries, args.version)
+    print(f"Wrote {len(entries)} entries to {args.output} (version {version})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Background job queue for slow admin operations.
+
+Jobs are persisted in a table of ``capcut.db`` and executed by a thread pool
+that is separate from the request-serving workers. Handlers receive a
+``JobContext`` they use to report progress; every progress report also
+checks whether the job was cancelled, so cancellation works across
+processes through the shared job table.
+"""
+import json
+import logging
+import os
+import socket
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+TERMINAL_STATUSES = ('succeeded', 'failed', 'cancelled')
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when its job has been cancelled"""
+
+
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_alive(owner: Optional[str]) -> bool:
+    """Whether the process that claimed a job on this host still exists"""
+    if not owner:
+        return False
+    host, _, pid = owner.rpartition(':')
+    if host != socket.gethostname():
+        return True  # cannot tell for other hosts, leave their jobs alone
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def serialize_job(job) -> Dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "message": job.message,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "cancel_requested": job.cancel_requested,
+        "created_at": job.created_at.strftime("%Y-%m-%d %H:%M:%S") if job.created_at else None,
+        "started_at": job.started_at.strftime("%Y-%m-%d %H:%M:%S") if job.started_at else None,
+        "finished_at": job.finished_at.strftime("%Y-%m-%d %H:%M:%S") if job.finished_at else None
+    }
+
+
+class JobContext:
+    """Handle passed to job handlers for progress reporting and cancellation"""
+
+    def __init__(self, queue: "JobQueue", job_id: str):
+        self._queue = queue
+        self.job_id = job_id
+
+    def progress(self, fraction: float, message: Optional[str] = None):
+        """Record progress (0..1) and stop the job if it was cancelled"""
+        db, model = self._queue.db, self._queue.model
+        job = db.session.get(model, self.job_id, populate_existing=True)
+        if job.cancel_requested:
+            raise JobCancelled()
+        job.progress = max(0.0, min(1.0, fraction))
+        if message is not None:
+            job.message = message[:200]
+        db.session.commit()
+
+
+class JobQueue:
+    """Persistent job table plus an in-process worker pool"""
+
+    def __init__(self, app, db, model, max_workers: int = 2):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.handlers: Dict[str, Callable] = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="admin-job")
+
+    def register(self, kind: str):
+        """Decorator registering a handler ``fn(ctx, **params)`` for a job kind"""
+        def decorator(fn):
+            self.handlers[kind] = fn
+            return fn
+        return decorator
+
+    def submit(self, kind: str, **params) -> str:
+        """Persist a queued job and schedule it, returns the job id"""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = self.model(
+            id=str(uuid.uuid4()),
+            kind=kind,
+            status='queued',
+            progress=0.0,
+            params=json.dumps(params),
+            owner=_owner()
+        )
+        self.db.session.add(job)
+        self.db.session.commit()
+        self.executor.submit(self._run, job.id)
+        return job.id
+
+    def cancel(self, job_id: str):
+        """Request cancellation; queued jobs are cancelled immediately"""
+        job = self.db.session.get(self.model, job_id)
+        if job is None or job.status in TERMINAL_STATUSES:
+            return job
+        job.cancel_requested = True
+        if job.status == 'queued':
+            job.status = 'cancelled'
+            job.finished_at = datetime.utcnow()
+        self.db.session.commit()
+        return job
+
+    def recover(self):
+        """Fail jobs whose owning process died before finishing them"""
+        stale = self.model.query.filter(self.model.status.in_(('queued', 'running'))).all()
+        for job in stale:
+            if not _owner_alive(job.owner):
+                job.status = 'failed'
+                job.error = "Interrupted by server restart"
+                job.finished_at = datetime.utcnow()
+        self.db.session.commit()
+
+    def _run(self, job_id: str):
+        with self.app.app_context():
+            session = self.db.session
+            job = None
+            try:
+                job = session.get(self.model, job_id)
+                if job is None or job.status != 'queued':
+                    return  # cancelled while waiting
+                job.status = 'running'
+                job.started_at = datetime.utcnow()
+                session.commit()
+
+                handler = self.handlers[job.kind]
+                result = handler(JobContext(self, job_id), **json.loads(job.params or "{}"))
+
+                job = session.get(self.model, job_id, populate_existing=True)
+                job.status = 'succeeded'
+                job.progress = 1.0
+                job.result = json.dumps(result) if result is not None else None
+            except JobCancelled:
+                session.rollback()
+                job = session.get(self.model, job_id, populate_existing=True)
+                job.status = 'cancelled'
+            except Exception as e:
+                logging.error(f"Job {job_id} failed: {str(e)}")
+                session.rollback()
+                job = session.get(self.model, job_id, populate_existing=True)
+                job.status = 'failed'
+                job.error = str(e)
+            finally:
+                if job is not None and job.status in TERMINAL_STATUSES:
+                    job.finished_at = job.finished_at or datetime.utcnow()
+                    session.commit()
+                session.remove()
@@ -0,0 +1,188 @@
+"""Ordered schema migrations for capcut.db.
+
+Each revision runs once, in its own transaction, and is recorded in the
+``schema_migrations`` table. The baseline revision is a frozen copy of the
+schema ``db.create_all()`` used to produce: it creates whichever of those
+tables are missing, so fresh databases and ones created by ``create_all``
+converge on the same history. It never follows the models, so every later
+schema change (new columns included) needs its own revision.
+
+Pending revisions are applied when the server starts.
+
+Usage:
+    python migrations.py            # list applied and pending revisions
+"""
+import logging
+import os
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import (Boolean, Column, DateTime, Float, Index, Integer, MetaData, String, Table, Text,
+                        create_engine, exc, select, text)
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from database import database_url
+
+MIGRATIONS: List[Tuple[str, str, Callable]] = []
+
+_history_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _history_metadata,
+    Column('revision', String(50), primary_key=True),
+    Column('description', String(200)),
+    Column('applied_at', DateTime, default=datetime.utcnow)
+)
+
+
+def migration(revision: str, description: str):
+    """Register ``fn(connection)`` as a migration revision"""
+    def decorator(fn):
+        MIGRATIONS.append((revision, description, fn))
+        return fn
+    return decorator
+
+
+def _create_all(conn, metadata):
+    """Create missing tables and indexes with IF NOT EXISTS, so concurrent workers can race"""
+    for table in metadata.sorted_tables:
+        conn.execute(CreateTable(table, if_not_exists=True))
+        for index in table.indexes:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def applied_revisions(engine) -> set:
+    with engine.begin() as conn:
+        _create_all(conn, _history_metadata)
+    with engine.connect() as conn:
+        return {row.revision for row in conn.execute(select(schema_migrations.c.revision))}
+
+
+def upgrade(engine) -> List[str]:
+    """Apply pending revisions in order, returns the revisions applied"""
+    done = applied_revisions(engine)
+    newly_applied = []
+    for revision, description, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if revision in done:
+            continue
+        try:
+            with engine.begin() as conn:
+                # Another worker may have applied it since we looked
+                if conn.execute(select(schema_migrations.c.revision)
+                                .where(schema_migrations.c.revision == revision)).first():
+                    continue
+                fn(conn)
+                conn.execute(schema_migrations.insert().values(
+                    revision=revision, description=description, applied_at=datetime.utcnow()
+                ))
+        except exc.IntegrityError:
+            # ...or is applying it right now; its history row won the race
+            continue
+        logging.info(f"Applied migration {revision}: {description}")
+        newly_applied.append(revision)
+    return newly_applied
+
+
+# Schema as of revision 0001, frozen: do not edit to follow model changes
+_baseline_metadata = MetaData()
+Table(
+    'customer_insights', _baseline_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('email', String(100), nullable=False),
+    Column('use_case', String(100), nullable=False)
+)
+Table(
+    'help_documents', _baseline_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('title', String(200), nullable=False),
+    Column('content', Text, nullable=False),
+    Column('doc_type', String(50)),
+    Column('uploaded_at', DateTime),
+    Index('ix_help_documents_doc_type', 'doc_type')
+)
+Table(
+    'survey_responses', _baseline_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('session_id', String(36)),
+    Column('question', String(200)),
+    Column('answer', Text),
+    Column('responded_at', DateTime),
+    Index('ix_survey_responses_session_id', 'session_id')
+)
+Table(
+    'jobs', _baseline_metadata,
+    Column('id', String(36), primary_key=True),
+    Column('kind', String(50), nullable=False),
+    Column('status', String(20), nullable=False),
+    Column('progress', Float),
+    Column('message', String(200)),
+    Column('params', Text),
+    Column('result', Text),
+    Column('error', Text),
+    Column('cancel_requested', Boolean),
+    Column('owner', String(100)),
+    Column('created_at', DateTime),
+    Column('started_at', DateTime),
+    Column('finished_at', DateTime),
+    Index('ix_jobs_status', 'status')
+)
+Table(
+    'resource_versions', _baseline_metadata,
+    Column('name', String(50), primary_key=True),
+    Column('version', Integer, nullable=False)
+)
+
+
+# Revisions
+@migration('0001', 'Baseline schema')
+def baseline(conn):
+    _create_all(conn, _baseline_metadata)
+
+
+@migration('0002', 'Indexes matched to query patterns')
+def query_indexes(conn):
+    for statement in (
+        # /rag-documents and /rag/documents order by upload time
+        "CREATE INDEX IF NOT EXISTS ix_help_documents_uploaded_at ON help_documents (uploaded_at)",
+        # job recovery filters by status, /jobs lists newest first
+        "CREATE INDEX IF NOT EXISTS ix_jobs_status_created_at ON jobs (status, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_jobs_created_at ON jobs (created_at)",
+        "DROP INDEX IF EXISTS ix_jobs_status",
+    ):
+        conn.execute(text(statement))
+
+
+@migration('0003', 'Seed response cache version counters')
+def seed_resource_versions(conn):
+    # A single INSERT ... WHERE NOT EXISTS, so concurrent workers cannot both insert
+    for name in ('customer_insights', 'help_documents', 'survey_responses'):
+        conn.execute(text(
+            "INSERT INTO resource_versions (name, version) SELECT :name, 0 "
+            "WHERE NOT EXISTS (SELECT 1 FROM resource_versions WHERE name = :name)"
+        ), {"name": name})
+
+
+@migration('0004', 'Shared chat engagement counters')
+def chat_engagement(conn):
+    metadata = MetaData()
+    Table(
+        'chat_engagement', metadata,
+        Column('session_id', String(100), primary_key=True),
+        Column('total', Integer, nullable=False),
+        Column('buckets', String(200)),
+        Column('current_bucket', Integer),
+        Column('last_seen', Float, nullable=False),
+        Column('last_suggested_at', Float),
+        Column('suggestions', Integer, nullable=False),
+        Column('surveyed', Boolean, nullable=False),
+        Index('ix_chat_engagement_last_seen', 'last_seen')
+    )
+    _create_all(conn, metadata)
+
+
+if __name__ == "__main__":
+    instance_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance")
+    os.makedirs(instance_path, exist_ok=True)
+    done = applied_revisions(create_engine(database_url(instance_path)))
+    for revision, description, _ in sorted(MIGRATIONS, key=lambda m: m[0]):
+        print(f"{revision}  {'applied' if revision in done else 'pending'}  {description}")
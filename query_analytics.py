@@ -0,0 +1,272 @@
+"""Background analytics for incoming chat queries.
+
+Queries are handed over from the request path through a bounded queue (and
+dropped when it is full) and appended to a JSONL log shared by all worker
+processes. One process at a time holds a lock next to the log and is its
+single consumer: it reads the log from the start, embeds the queries in
+batches and clusters them incrementally with mini-batch k-means, then writes
+a summary file that every worker serves. Near-duplicate questions are
+collapsed in embedding space so each cluster keeps a few distinct
+representative questions.
+"""
+import fcntl
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+
+class QueryAnalytics:
+    """Streams chat queries into a shared log and serves the consumer's query clusters"""
+
+    def __init__(self, log_path: str, embed_fn: Callable, n_clusters: int = 20,
+                 batch_size: int = 64, max_queue: int = 1000, flush_interval: float = 5.0,
+                 dedup_threshold: float = 0.95, max_representatives: int = 5,
+                 cache_size: int = 10000, summary_path: Optional[str] = None):
+        self.log_path = log_path
+        self.summary_path = summary_path or log_path + ".summary.json"
+        self.embed_fn = embed_fn
+        self.n_clusters = n_clusters
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dedup_threshold = dedup_threshold
+        self.max_representatives = max_representatives
+        self.cache_size = cache_size
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stats = {"received": 0, "dropped": 0, "logged": 0}
+        self._consumer_lock_file = None
+        self._log_offset = 0
+        self._summary = None
+        self._summary_signature = None
+        self._reset_clusters()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def _reset_clusters(self):
+        self._model = MiniBatchKMeans(n_clusters=self.n_clusters, random_state=0, n_init=3)
+        self._fitted = False
+        self._pending: List = []  # (text, vector) waiting for the first fit
+        self._embedding_cache = OrderedDict()
+        self._sizes = np.zeros(self.n_clusters, dtype=np.int64)
+        self._representatives: Dict[int, List[Dict]] = {}
+        self._consumer_stats = {"clustered": 0, "embedded": 0, "embed_cache_hits": 0}
+
+    # Request path
+    def record(self, query: str, session_id: Optional[str] = None):
+        """Enqueue a query without blocking; drops it under backpressure"""
+        self._ensure_started()
+        self.stats["received"] += 1
+        try:
+            self.queue.put_nowait({
+                "ts": datetime.utcnow().isoformat(),
+                "query": query,
+                "session_id": session_id
+            })
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="query-analytics", daemon=True)
+                    self._thread.start()
+
+    # Background worker
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                batch.append(self.queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                if batch:
+                    self._append_log(batch)
+                if self._is_consumer():
+                    self._consume_log()
+            except Exception as e:
+                logging.error(f"Query analytics error: {str(e)}")
+
+    def _append_log(self, batch: List[Dict]):
+        payload = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch)
+        # One O_APPEND write per batch so workers never interleave records
+        fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, payload.encode("utf-8"))
+        finally:
+            os.close(fd)
+        self.stats["logged"] += len(batch)
+
+    def _is_consumer(self) -> bool:
+        """Take the consumer lock if no other process holds it, keeping it for life"""
+        if self._consumer_lock_file is not None:
+            return True
+        lock_file = open(self.log_path + ".lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._consumer_lock_file = lock_file
+        logging.info(f"Clustering queries from {self.log_path} in this process")
+        return True
+
+    def _consume_log(self):
+        """Cluster log records past the consumed offset and publish the summary"""
+        try:
+            size = os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            return
+        if size < self._log_offset:
+            # Truncated or rotated: rebuild from the new file
+            with self._lock:
+                self._reset_clusters()
+            self._log_offset = 0
+        if size == self._log_offset:
+            return
+
+        with open(self.log_path, "rb") as f:
+            f.seek(self._log_offset)
+            texts = []
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # a record is complete once its newline is written
+                self._log_offset += len(line)
+                try:
+                    texts.append(json.loads(line)["query"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if len(texts) >= self.batch_size:
+                    self._process(texts)
+                    texts = []
+            if texts:
+                self._process(texts)
+        self._write_summary()
+
+    def _embed(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        """Embed unique texts, reusing cached vectors for repeated questions"""
+        vectors = {}
+        missing = []
+        for text in dict.fromkeys(texts):
+            if text in self._embedding_cache:
+                self._embedding_cache.move_to_end(text)
+                vectors[text] = self._embedding_cache[text]
+                self._consumer_stats["embed_cache_hits"] += 1
+            else:
+                missing.append(text)
+
+        if missing:
+            for text, embedding in zip(missing, self.embed_fn(missing)):
+                if not len(embedding):
+                    continue  # embedding failed for this text
+                vector = np.asarray(embedding, dtype=np.float32)
+                vector /= np.linalg.norm(vector) or 1.0
+                vectors[text] = vector
+                self._embedding_cache[text] = vector
+            self._consumer_stats["embedded"] += len(missing)
+            while len(self._embedding_cache) > self.cache_size:
+                self._embedding_cache.popitem(last=False)
+        return vectors
+
+    def _process(self, texts: List[str]):
+        vectors = self._embed(texts)
+        items = [(text, vectors[text]) for text in texts if text in vectors]
+        self._consumer_stats["clustered"] += len(texts)
+        if not items:
+            return
+
+        with self._lock:
+            if not self._fitted:
+                self._pending.extend(items)
+                if len(self._pending) < self.n_clusters:
+                    return
+                items, self._pending = self._pending, []
+
+            matrix = np.stack([vector for _, vector in items])
+            self._model.partial_fit(matrix)
+            self._fitted = True
+            labels = self._model.predict(matrix)
+            for (text, vector), label in zip(items, labels):
+                self._sizes[label] += 1
+                self._add_representative(int(label), text, vector)
+
+    def _add_representative(self, label: int, text: str, vector: np.ndarray):
+        """Keep distinct questions per cluster, folding near-duplicates together"""
+        candidates = self._representatives.setdefault(label, [])
+        if candidates:
+            similarities = np.stack([c["vector"] for c in candidates]) @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.dedup_threshold or len(candidates) >= self.max_representatives:
+                candidates[best]["hits"] += 1
+                return
+        candidates.append({"text": text, "vector": vector, "hits": 1})
+
+    # Summary shared with the other workers
+    def _clusters(self) -> Tuple[List[Dict], int]:
+        with self._lock:
+            clusters = [
+                {
+                    "cluster": label,
+                    "size": int(self._sizes[label]),
+                    "representatives": [
+                        c["text"] for c in sorted(candidates, key=lambda c: -c["hits"])
+                    ]
+                }
+                for label, candidates in self._representatives.items()
+            ]
+            pending = len(self._pending)
+        clusters.sort(key=lambda c: -c["size"])
+        return clusters, pending
+
+    def _write_summary(self):
+        clusters, pending = self._clusters()
+        summary = {
+            "updated_at": datetime.utcnow().isoformat(),
+            "clusters": clusters,
+            "stats": dict(self._consumer_stats, pending=pending)
+        }
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(self.summary_path) + ".tmp.",
+                                        dir=os.path.dirname(os.path.abspath(self.summary_path)))
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False)
+        os.replace(tmp_path, self.summary_path)
+
+    def _read_summary(self) -> Optional[Dict]:
+        try:
+            st = os.stat(self.summary_path)
+        except FileNotFoundError:
+            return None
+        signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if signature != self._summary_signature:
+            with open(self.summary_path, encoding="utf-8") as f:
+                self._summary = json.load(f)
+            self._summary_signature = signature
+        return self._summary
+
+    # Dashboard
+    def snapshot(self) -> Dict:
+        """Cluster sizes and representative questions, largest clusters first
+
+        Clusters come from the consumer's last summary; received, dropped,
+        logged and queued count this worker's own hand-offs.
+        """
+        self._ensure_started()
+        summary = self._read_summary() or {"clusters": [], "stats": {}}
+        return {
+            "clusters": summary["clusters"],
+            "updated_at": summary.get("updated_at"),
+            "stats": dict(summary["stats"], **self.stats, queued=self.queue.qsize())
+        }
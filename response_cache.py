@@ -0,0 +1,148 @@
+"""Server-side response cache with conditional requests for read-mostly endpoints.
+
+Each cached view declares the database resources it reads. A cached body is
+reused until one of those resources' version counters changes, and is served
+with a strong ETag (one per content encoding) so clients can revalidate with
+``If-None-Match`` and get an empty 304. Large bodies are compressed with
+brotli (when installed) or gzip, once per cached version.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Dict, Iterable, Tuple
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSORS = {"gzip": lambda body: gzip.compress(body, compresslevel=6)}
+if brotli is not None:
+    COMPRESSORS["br"] = lambda body: brotli.compress(body, quality=5)
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    """Parse Accept-Encoding into {coding: q}"""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def _if_none_match() -> set:
+    header = request.headers.get("If-None-Match", "")
+    return {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
+
+
+class _Entry:
+    __slots__ = ("versions", "body", "mimetype", "base_tag", "encoded")
+
+    def __init__(self, versions, body: bytes, mimetype: str):
+        self.versions = versions
+        self.body = body
+        self.mimetype = mimetype
+        self.base_tag = hashlib.sha256(body).hexdigest()[:32]
+        self.encoded: Dict[str, bytes] = {}
+
+    def etag(self, encoding: str = None) -> str:
+        return f'"{self.base_tag}-{encoding}"' if encoding else f'"{self.base_tag}"'
+
+
+class ResponseCache:
+    """Caches successful responses keyed by path and resource versions.
+
+    Only the query arguments a view declares are part of the key, and at most
+    ``max_entries`` bodies are kept, least recently used first out.
+    """
+
+    def __init__(self, version_fn: Callable[[Iterable[str]], Tuple], min_compress_size: int = 1024,
+                 cache_control: str = "private, no-cache", max_entries: int = 256):
+        self.version_fn = version_fn
+        self.min_compress_size = min_compress_size
+        self.cache_control = cache_control
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+    def cached(self, *resources: str, query_args: Iterable[str] = ()):
+        """Decorator caching a view until one of ``resources`` is written
+
+        ``query_args`` lists the request arguments the view reads; any other
+        argument is ignored, so it cannot create new cache entries.
+        """
+        query_args = tuple(sorted(query_args))
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                versions = self.version_fn(resources)
+                key = (request.path,) + tuple(request.args.get(arg) for arg in query_args)
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry is not None:
+                        self._entries.move_to_end(key)
+                if entry is None or entry.versions != versions:
+                    self.stats["misses"] += 1
+                    response = view(*args, **kwargs)
+                    status = 200
+                    if isinstance(response, tuple):
+                        response, status = response[0], response[1]
+                    if status != 200:
+                        return response, status
+                    entry = _Entry(versions, response.get_data(), response.mimetype)
+                    with self._lock:
+                        self._entries[key] = entry
+                        self._entries.move_to_end(key)
+                        while len(self._entries) > self.max_entries:
+                            self._entries.popitem(last=False)
+                else:
+                    self.stats["hits"] += 1
+                return self._serve(entry)
+            return wrapper
+        return decorator
+
+    def _choose_encoding(self, entry: _Entry):
+        if len(entry.body) < self.min_compress_size:
+            return None
+        accepted = _accepted_encodings(request.headers.get("Accept-Encoding", ""))
+        for encoding in ("br", "gzip"):
+            if encoding in COMPRESSORS and accepted.get(encoding, accepted.get("*", 0)) > 0:
+                return encoding
+        return None
+
+    def _serve(self, entry: _Entry) -> Response:
+        encoding = self._choose_encoding(entry)
+        etag = entry.etag(encoding)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding"
+        }
+
+        client_tags = _if_none_match()
+        if etag in client_tags or "*" in client_tags:
+            self.stats["not_modified"] += 1
+            return Response(status=304, headers=headers)
+
+        body = entry.body
+        if encoding:
+            if encoding not in entry.encoded:
+                entry.encoded[encoding] = COMPRESSORS[encoding](entry.body)
+            body = entry.encoded[encoding]
+            headers["Content-Encoding"] = encoding
+        return Response(body, status=200, mimetype=entry.mimetype, headers=headers)
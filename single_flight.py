@@ -0,0 +1,67 @@
+"""Single-flight coalescing of concurrent identical calls.
+
+The first caller for a key (the leader) runs the computation; callers that
+arrive while it is in flight wait for the leader's result instead of
+repeating the work.
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls that share a key"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "merged": 0, "timeouts": 0, "errors": 0}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """Run fn once per in-flight key, returns (result, shared).
+
+        Waiters give up with TimeoutError after ``timeout`` seconds; the
+        leader's exception is re-raised in every waiter.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["leaders"] += 1
+            else:
+                self._stats["merged"] += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+                with self._lock:
+                    self._stats["errors"] += 1
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.event.set()
+            return call.result, False
+
+        if not call.event.wait(timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise TimeoutError(f"timed out after {timeout}s waiting for in-flight call")
+        if call.error is not None:
+            raise call.error
+        return call.result, True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 import requests
+import time
 from datetime import datetime
 
 # ========== Configuration ==========
@@ -46,13 +47,27 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 
+def cached_get(path):
+    """GET a backend endpoint, revalidating the last copy with its ETag."""
+    cache = st.session_state.setdefault('http_cache', {})
+    headers = {'If-None-Match': cache[path][0]} if path in cache else {}
+    response = requests.get(f"{API_URL}{path}", headers=headers)
+    if response.status_code == 304 and path in cache:
+        return 200, cache[path][1]
+    if response.status_code != 200:
+        return response.status_code, None
+    data = response.json()
+    if response.headers.get('ETag'):
+        cache[path] = (response.headers['ETag'], data)
+    return 200, data
+
 # Add to admin_app.py
 def fetch_survey_results():
     """Fetch survey data from backend"""
     try:
-        response = requests.get(f"{API_URL}/survey/results")
-        if response.status_code == 200:
-            return response.json()
+        status_code, data = cached_get("/survey/results")
+        if status_code == 200:
+            return data
         return {}
     except Exception as e:
         st.error(f"Error: {str(e)}")
@@ -84,11 +99,11 @@ def fetch_survey_results():
 def fetch_customer_insights():
     """Fetch customer insights from the backend."""
     try:
-        response = requests.get(f"{API_URL}/customer-insights")
-        if response.status_code == 200:
-            return pd.DataFrame(response.json().get('contacts', []))
+        status_code, data = cached_get("/customer-insights")
+        if status_code == 200:
+            return pd.DataFrame(data.get('contacts', []))
         else:
-            st.error(f"Failed to fetch customer insights: {response.status_code}")
+            st.error(f"Failed to fetch customer insights: {status_code}")
             return pd.DataFrame()
     except Exception as e:
         st.error(f"Error connecting to server: {str(e)}")
@@ -97,16 +112,29 @@ def fetch_customer_insights():
 def fetch_rag_documents():
     """Fetch RAG documents from the backend."""
     try:
-        response = requests.get(f"{API_URL}/rag-documents")
-        if response.status_code == 200:
-            return response.json().get('documents', [])
+        status_code, data = cached_get("/rag-documents")
+        if status_code == 200:
+            return data.get('documents', [])
         else:
-            st.error(f"Failed to fetch RAG documents: {response.status_code}")
+            st.error(f"Failed to fetch RAG documents: {status_code}")
             return []
     except Exception as e:
         st.error(f"Error connecting to server: {str(e)}")
         return []
 
+def fetch_query_clusters():
+    """Fetch clustered chat queries from the backend."""
+    try:
+        response = requests.get(f"{API_URL}/analytics/query-clusters")
+        if response.status_code == 200:
+            return response.json()
+        else:
+            st.error(f"Failed to fetch query clusters: {response.status_code}")
+            return {}
+    except Exception as e:
+        st.error(f"Error connecting to server: {str(e)}")
+        return {}
+
 def upload_rag_document(title, content, doc_type):
     """Upload a new RAG document to the backend."""
     try:
@@ -117,7 +145,8 @@ def upload_rag_document(title, content, doc_type):
         }
         response = requests.post(f"{API_URL}/upload-rag-document", json=payload)
         if response.status_code == 201:
-            st.success("Document uploaded successfully!")
+            st.success("Document uploaded successfully! Indexing continues in the background.")
+            st.session_state['upload_job'] = response.json().get('job_id')
             return True
         else:
             st.error(f"Failed to upload document: {response.status_code}")
@@ -126,12 +155,59 @@ def upload_rag_document(title, content, doc_type):
         st.error(f"Error uploading document: {str(e)}")
         return False
 
+def start_job(endpoint, state_key):
+    """Start a background job on the backend and remember its ID."""
+    try:
+        response = requests.post(f"{API_URL}/{endpoint}")
+        if response.status_code == 202:
+            st.session_state[state_key] = response.json().get('job_id')
+        else:
+            st.error(f"Failed to start job: {response.status_code}")
+    except Exception as e:
+        st.error(f"Error starting job: {str(e)}")
+
+def fetch_job(job_id):
+    """Fetch the status of a background job."""
+    try:
+        response = requests.get(f"{API_URL}/jobs/{job_id}")
+        if response.status_code == 200:
+            return response.json()
+        return None
+    except Exception as e:
+        st.error(f"Error connecting to server: {str(e)}")
+        return None
+
+def show_job_progress(state_key, label):
+    """Render a progress bar for a job; returns True while it is still active."""
+    job_id = st.session_state.get(state_key)
+    if not job_id:
+        return False
+    job = fetch_job(job_id)
+    if not job:
+        del st.session_state[state_key]
+        return False
+
+    if job['status'] in ('queued', 'running'):
+        st.progress(job.get('progress') or 0.0, text=f"{label}: {job.get('message') or job['status']}")
+        if st.button("Cancel", key=f"{state_key}_cancel"):
+            requests.post(f"{API_URL}/jobs/{job_id}/cancel")
+        return True
+
+    if job['status'] == 'succeeded':
+        st.success(f"{label} completed successfully!")
+    elif job['status'] == 'cancelled':
+        st.warning(f"{label} was cancelled.")
+    else:
+        st.error(f"{label} failed: {job.get('error')}")
+    del st.session_state[state_key]
+    return False
+
 # ========== Main Interface ==========
 st.title("🛠️ Admin Dashboard - CapCut AI Assistant")
 st.markdown("Manage customer insights, train the chatbot with RAG documents, and monitor system performance.")
 
 # Tabs for different admin functionalities
-tab1, tab2, tab3, tab4 = st.tabs(["Customer Insights", "RAG Management", "Train Chatbot", "Survey Results"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(["Customer Insights", "RAG Management", "Train Chatbot", "Survey Results", "Query Analytics"])
 
 # Tab 1: Customer Insights
 with tab1:
@@ -184,6 +260,8 @@ with tab2:
         
         if submitted and title and content and doc_type:
             upload_rag_document(title, content, doc_type)
+    
+    jobs_active = show_job_progress('upload_job', "Document indexing")
 
 # Tab 3: Train Chatbot
 with tab3:
@@ -200,15 +278,15 @@ with tab3:
     
     # Trigger training process with a unique key
     if st.button("Start Training", key="train_chatbot_button"):
-        with st.spinner("Training the chatbot..."):
-            try:
-                response = requests.post(f"{API_URL}/train-chatbot")
-                if response.status_code == 200:
-                    st.success("Chatbot training completed successfully!")
-                else:
-                    st.error(f"Failed to train chatbot: {response.status_code}")
-            except Exception as e:
-                st.error(f"Error starting training process: {str(e)}")
+        start_job("train-chatbot", 'train_job')
+    
+    jobs_active = show_job_progress('train_job', "Chatbot training") or jobs_active
+    
+    # Publish the knowledge base to read-only retrieval workers
+    if st.button("Export Vector Snapshot", key="export_vectors_button"):
+        start_job("export-vectors", 'export_job')
+    
+    jobs_active = show_job_progress('export_job', "Vector export") or jobs_active
 
 # Tab 4: Survey Results
 with tab4:
@@ -245,14 +323,42 @@ with tab4:
         The chatbot will use these documents to improve its responses.
     """)
     
-    # Trigger training process (mocked here)
+    # Trigger training process (progress is shown on the Train Chatbot tab)
     if st.button("Start Training"):
-        with st.spinner("Training the chatbot..."):
-            try:
-                response = requests.post(f"{API_URL}/train-chatbot")
-                if response.status_code == 200:
-                    st.success("Chatbot training completed successfully!")
-                else:
-                    st.error(f"Failed to train chatbot: {response.status_code}")
-            except Exception as e:
-                st.error(f"Error starting training process: {str(e)}")
+        start_job("train-chatbot", 'train_job')
+        st.rerun()
+
+# Tab 5: Query Analytics
+with tab5:
+    st.header("🔎 What Users Ask")
+    
+    with st.spinner("Fetching query clusters..."):
+        analytics = fetch_query_clusters()
+    
+    if analytics:
+        stats = analytics.get('stats', {})
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Queries Received", stats.get('received', 0))
+        col2.metric("Queries Clustered", sum(c['size'] for c in analytics.get('clusters', [])))
+        col3.metric("Dropped (Backpressure)", stats.get('dropped', 0))
+    
+    if analytics.get('clusters'):
+        clusters = pd.DataFrame([
+            {
+                "Cluster": c['cluster'],
+                "Size": c['size'],
+                "Representative Questions": " | ".join(c['representatives'])
+            }
+            for c in analytics['clusters']
+        ])
+        st.subheader("Cluster Sizes")
+        st.bar_chart(clusters.set_index("Cluster")["Size"])
+        st.subheader("Representative Questions")
+        st.dataframe(clusters)
+    else:
+        st.info("Not enough queries collected yet.")
+
+# Poll running background jobs so their progress bars keep moving
+if jobs_active:
+    time.sleep(1)
+    st.rerun()
@@ -46,6 +46,8 @@ if 'awaiting_survey_response' not in st.session_state:
     st.session_state.awaiting_survey_response = False
 if 'current_choices' not in st.session_state:
     st.session_state.current_choices = []
+if 'survey_suggested' not in st.session_state:
+    st.session_state.survey_suggested = False
 
 # ========== Helper Functions ==========
 def handle_survey_interaction(user_input: str):
@@ -55,6 +57,7 @@ def handle_survey_interaction(user_input: str):
             f"{API_URL}/survey",
             json={
                 'session_id': st.session_state.survey_session,
+                'chat_session_id': st.session_state.get('session_id'),
                 'message': user_input
             },
             timeout=5  # Add timeout for better error handling
@@ -111,8 +114,11 @@ with st.sidebar:
 
     # Survey trigger button
     if not st.session_state.survey_active:
+        if st.session_state.survey_suggested:
+            st.markdown('<div class="survey-badge">📝 We\'d love your feedback!</div>', unsafe_allow_html=True)
         if st.button("📝 Take Quick Survey (2 mins)", help="Help us improve!", key="survey_trigger"):
             st.session_state.survey_active = True
+            st.session_state.survey_suggested = False
             st.session_state.awaiting_survey_response = True
             st.session_state.survey_session = str(uuid.uuid4())
             st.rerun()
@@ -244,16 +250,9 @@ else:
                     'is_user': False
                 })
                 
-                # Periodic survey prompt after every 5 interactions
-                interaction_count = st.session_state.get('interaction_count', 0) + 1
-                if interaction_count % 5 == 0:
-                    st.session_state.chat_history.append({
-                        'text': "📝 We'd love your feedback! Type 'survey' or click the button to help us improve!",
-                        'is_user': False
-                    })
-                
-                # Update interaction count in session state
-                st.session_state['interaction_count'] = interaction_count
+                # The backend decides when to suggest the survey
+                if data.get('survey_suggested'):
+                    st.session_state.survey_suggested = True
                 
             else:
                 # Handle backend errors gracefully
@@ -0,0 +1,187 @@
+"""Memory-mapped vector snapshot for read-only retrieval workers.
+
+The export step copies the ``capcut_knowledge_v1`` vectors out of Chroma into
+a single float32 file. Workers memory-map it, so every process on a host
+shares one copy through the page cache, and answer top-k queries with a
+vectorized dot product. Rows are L2-normalized, so scores are cosine
+similarities. Ids and documents stay in the mapping too and only the top-k
+hits of a query are decoded, so per-worker memory does not grow with the
+corpus.
+
+File layout (little endian):
+    header   magic (8s) | build version (u64) | rows (u32) | dim (u32) |
+             offsets offset (u64) | text offset (u64), padded to 64 bytes
+    matrix   rows x dim float32, row-major
+    offsets  2 * rows + 1 u64 boundaries into the text block: row i's id is
+             text[offsets[2i]:offsets[2i + 1]], its document runs to offsets[2i + 2]
+    text     UTF-8 ids and documents, interleaved
+
+Usage:
+    python vector_snapshot.py --output capcut_vectors.snap
+"""
+import argparse
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"CCVECSN2"
+HEADER = struct.Struct("<8sQIIQQ")
+HEADER_SIZE = 64
+
+
+def write_snapshot(path: str, ids: List[str], vectors, documents: List[str],
+                   version: Optional[int] = None) -> int:
+    """Atomically write a snapshot to path, returns the build version"""
+    version = int(time.time()) if version is None else version
+    matrix = np.asarray(vectors, dtype="<f4").reshape(len(ids), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.where(norms == 0, 1, norms)
+    texts = [value.encode("utf-8") for pair in zip(ids, documents) for value in pair]
+    offsets = np.zeros(len(texts) + 1, dtype="<u8")
+    np.cumsum([len(text) for text in texts], out=offsets[1:])
+    offsets_offset = HEADER_SIZE + matrix.nbytes
+    text_offset = offsets_offset + offsets.nbytes
+
+    # Unique per writer: exports from two job threads must not share a temp file
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".tmp.",
+                                    dir=os.path.dirname(os.path.abspath(path)))
+    os.fchmod(fd, 0o644)
+    with os.fdopen(fd, "wb") as f:
+        header = HEADER.pack(MAGIC, version, matrix.shape[0], matrix.shape[1],
+                             offsets_offset, text_offset)
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(np.ascontiguousarray(matrix, dtype="<f4").tobytes())
+        f.write(offsets.tobytes())
+        for text in texts:
+            f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return version
+
+
+def read_collection(collection, page_size: int = 5000) -> Tuple[List[str], List, List[str]]:
+    """Page through a Chroma collection, returning ids, embeddings and documents"""
+    ids, vectors, documents = [], [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "documents"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        vectors.extend(page["embeddings"])
+        documents.extend(page["documents"])
+        offset += len(page["ids"])
+    return ids, vectors, documents
+
+
+def export_collection(collection, path: str, version: Optional[int] = None) -> int:
+    """Export every vector of a Chroma collection to a snapshot file"""
+    ids, vectors, documents = read_collection(collection)
+    if not ids:
+        raise ValueError("collection is empty, nothing to export")
+    return write_snapshot(path, ids, vectors, documents, version)
+
+
+class VectorSnapshot:
+    """Read-only, memory-mapped view of a snapshot file with atomic swaps.
+
+    The file is re-checked at most every ``reload_interval`` seconds and a
+    replaced file is mapped in place of the old one.
+    """
+
+    def __init__(self, path: str, reload_interval: float = 5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._state = None  # (matrix, offsets, text, version, file signature)
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> Optional[int]:
+        state = self._state
+        return state[3] if state else None
+
+    @property
+    def count(self) -> int:
+        state = self._state
+        return len(state[0]) if state else 0
+
+    def maybe_reload(self, force: bool = False) -> bool:
+        """Map a new snapshot file if it changed on disk"""
+        with self._lock:
+            self._next_check = time.monotonic() + self.reload_interval
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                self._state = None
+                return False
+            signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+            if not force and self._state and self._state[4] == signature:
+                return False
+            try:
+                self._state = self._open(signature)
+            except Exception as e:
+                logging.error(f"Vector snapshot load error: {str(e)}")
+                return False
+            logging.info(f"Loaded vector snapshot version {self._state[3]} ({self.count} vectors)")
+            return True
+
+    def _open(self, signature):
+        with open(self.path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, rows, dim, offsets_offset, text_offset = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"bad magic in {self.path}")
+        offsets = np.frombuffer(mm, dtype="<u8", count=2 * rows + 1, offset=offsets_offset)
+        if text_offset + int(offsets[-1]) > len(mm):
+            raise ValueError(f"truncated snapshot {self.path}")
+        matrix = np.frombuffer(mm, dtype="<f4", count=rows * dim, offset=HEADER_SIZE).reshape(rows, dim)
+        text = memoryview(mm)[text_offset:]
+        return matrix, offsets, text, version, signature
+
+    def query(self, embedding, n_results: int = 3) -> List[Tuple[str, str, float]]:
+        """Top-k (id, document, cosine score) for a query embedding"""
+        if time.monotonic() >= self._next_check:
+            self.maybe_reload()
+        state = self._state
+        if not state or not len(state[0]):
+            return []
+        matrix, offsets, text = state[0], state[1], state[2]
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        scores = matrix @ query
+        k = min(n_results, len(matrix))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        # Only the hits are decoded out of the mapping
+        results = []
+        for i in top:
+            start, middle, end = (int(x) for x in offsets[2 * i:2 * i + 3])
+            results.append((str(text[start:middle], "utf-8"), str(text[middle:end], "utf-8"),
+                            float(scores[i])))
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the Chroma knowledge base to a vector snapshot")
+    parser.add_argument("--output", default=os.getenv("VECTOR_SNAPSHOT_PATH", "./capcut_vectors.snap"))
+    parser.add_argument("--version", type=int, help="build version (defaults to a timestamp)")
+    args = parser.parse_args(argv)
+
+    from core import get_chroma_collection
+
+    version = export_collection(get_chroma_collection(), args.output, args.version)
+    print(f"Wrote snapshot version {version} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()